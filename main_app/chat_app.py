@@ -1,11 +1,23 @@
 import os
+import re
+import mmap
+import queue
+import hashlib
+import threading
+import multiprocessing
+import concurrent.futures
+import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
 from PyPDF2 import PdfReader
-from langchain.text_splitter import CharacterTextSplitter
+
+try:
+    import fitz  # pymupdf
+except ImportError:
+    fitz = None
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
-from langchain.memory import ConversationBufferMemory
+from langchain.memory import ConversationBufferWindowMemory
 from langchain.chains import ConversationalRetrievalChain
 from langchain_groq import ChatGroq
 from langchain_openai import AzureChatOpenAI
@@ -13,12 +25,130 @@ from langchain_openai import AzureChatOpenAI
 import warnings
 warnings.filterwarnings("ignore")
 
+# Only spin up worker processes for PDFs where the per-page cost outweighs
+# the process startup overhead
+PDF_PARALLEL_MIN_PAGES = 16
+
+# Cosine similarity above which two questions are treated as the same query
+SEMANTIC_CACHE_THRESHOLD = 0.95
+
+# Above this many rows, summary statistics are computed on a sample
+DESCRIBE_SAMPLE_ROWS = 100_000
+
+# Text files at least this large are read through mmap instead of read()
+MMAP_MIN_BYTES = 8 * 1024 * 1024
+
+# Caps on each batch handed to the embedding model: item count and total
+# padded tokens (rows x widest row in the batch)
+EMBED_BATCH_SIZE = 128
+EMBED_BATCH_TOKENS = 8192
+
+# Chunks tokenized per producer step, and how many padded batches may sit
+# queued between the tokenizer and the model
+TOKENIZE_SLICE = 1024
+EMBED_QUEUE_DEPTH = 4
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+# Compiled once so splitting runs in the regex engine's C loop
+_LINE_SPLIT_RE = re.compile(r"\n")
+
+def _split_text(text, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """Split text on newlines into overlapping chunks of about chunk_size chars"""
+    lines = [line for line in _LINE_SPLIT_RE.split(text) if line.strip()]
+
+    chunks = []
+    current = []
+    current_len = 0
+    for line in lines:
+        if current and current_len + len(line) + 1 > chunk_size:
+            chunks.append("\n".join(current))
+            # Carry trailing lines back over as overlap for the next chunk
+            overlap = []
+            overlap_len = 0
+            for prev in reversed(current):
+                if overlap_len + len(prev) + 1 > chunk_overlap:
+                    break
+                overlap.insert(0, prev)
+                overlap_len += len(prev) + 1
+            current = overlap
+            current_len = overlap_len
+        current.append(line)
+        current_len += len(line) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+# Loading the sentence-transformer takes seconds; keep one instance per process
+_embeddings_cache = None
+
+def _get_embeddings():
+    """Return the shared HuggingFaceEmbeddings instance, loading it once"""
+    global _embeddings_cache
+    if _embeddings_cache is not None:
+        return _embeddings_cache
+
+    try:
+        import torch
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    except ImportError:
+        device = "cpu"
+
+    model_kwargs = {"device": device}
+    if os.environ.get("EMBEDDINGS_BACKEND", "").lower() == "onnx":
+        # Runs the FP32 ONNX export of bge-small through onnxruntime; needs
+        # sentence-transformers[onnx] installed. Point EMBEDDINGS_ONNX_FILE
+        # at a quantized export (e.g. onnx/model_qint8_avx512_vnni.onnx)
+        # for INT8 inference.
+        model_kwargs["backend"] = "onnx"
+        onnx_file = os.environ.get("EMBEDDINGS_ONNX_FILE")
+        if onnx_file:
+            model_kwargs["model_kwargs"] = {"file_name": onnx_file}
+
+    _embeddings_cache = HuggingFaceEmbeddings(
+        model_name="BAAI/bge-small-en-v1.5",
+        model_kwargs=model_kwargs,
+        encode_kwargs={"batch_size": EMBED_BATCH_SIZE, "normalize_embeddings": True}
+    )
+    return _embeddings_cache
+
+# One process pool shared by every PDF extraction, created on first use.
+# The spawn context is safe to start from threads (process_files calls
+# extract_text_from_pdf from a thread pool, and forking a multi-threaded
+# process can deadlock), and sharing the pool caps total workers at
+# cpu_count instead of cpu_count per concurrent PDF.
+_pdf_executor = None
+_pdf_executor_lock = threading.Lock()
+
+def _get_pdf_executor():
+    """Return the shared process pool for PDF page extraction"""
+    global _pdf_executor
+    with _pdf_executor_lock:
+        if _pdf_executor is None:
+            _pdf_executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=os.cpu_count(),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+    return _pdf_executor
+
+def _extract_single_page(args):
+    """Extract text from one page of a PDF (runs in a worker process)"""
+    pdf_path, page_index = args
+    try:
+        reader = PdfReader(pdf_path)
+        return reader.pages[page_index].extract_text() or ""
+    except Exception:
+        return ""
+
 class ChatBackend:
     def __init__(self):
         load_dotenv()
         self.conversation = None
         self.vectorstore = None
         self.chat_history = None
+        self._exact_cache = {}
+        self._semantic_cache = []
 
     def process_file(self, file_path):
         """Extract text content from a file based on its extension"""
@@ -31,27 +161,52 @@ class ChatBackend:
                 
             elif file_ext in ['.csv', '.xlsx', '.xls']: 
                 if file_ext == '.csv':
-                    df = pd.read_csv(file_path)
+                    try:
+                        # PyArrow parses CSV in multithreaded C, far faster
+                        # than the default engine on big files
+                        df = pd.read_csv(file_path, engine="pyarrow")
+                    except (ImportError, ValueError):
+                        df = pd.read_csv(file_path)
                 else:
-                    df = pd.read_excel(file_path)
+                    try:
+                        # calamine is a Rust-backed reader, much faster than openpyxl
+                        df = pd.read_excel(file_path, engine="calamine")
+                    except (ImportError, ValueError):
+                        df = pd.read_excel(file_path)
                  
                 text = f"File: {os.path.basename(file_path)}\n"
                 text += f"Columns: {', '.join(df.columns)}\n"
                 text += f"Rows: {len(df)}\n\n"
                  
                 text += "Sample data:\n"
-                text += df.head(5).to_string() + "\n\n"
-                 
+                text += df.head(5).to_string(max_cols=20) + "\n\n"
+
                 text += "Summary statistics:\n"
                 numeric_cols = df.select_dtypes(include=['number']).columns
                 if len(numeric_cols) > 0:
-                    text += df[numeric_cols].describe().to_string()
+                    if len(df) > DESCRIBE_SAMPLE_ROWS:
+                        # describe() over every row of a huge frame is pure
+                        # overhead for a text summary; a sample is plenty
+                        stats = df[numeric_cols].sample(n=DESCRIBE_SAMPLE_ROWS, random_state=0).describe()
+                        text += f"(computed on a {DESCRIBE_SAMPLE_ROWS}-row sample)\n"
+                    else:
+                        stats = df[numeric_cols].describe()
+                    text += stats.to_string()
                 
                 return text
             
-            elif file_ext in ['.txt', '.md', '.json', '.xml', '.html']: 
+            elif file_ext in ['.txt', '.md', '.json', '.xml', '.html']:
+                header = f"File: {os.path.basename(file_path)}\n\n"
+
+                if os.path.getsize(file_path) >= MMAP_MIN_BYTES:
+                    # Map large files and decode straight from the mapped
+                    # pages, skipping the buffered read() copy loop
+                    with open(file_path, 'rb') as file:
+                        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                            return header + str(mapped[:], 'utf-8', 'ignore')
+
                 with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
-                    return f"File: {os.path.basename(file_path)}\n\n" + file.read()
+                    return header + file.read()
             
             else:
                 return f"Unsupported file type: {file_ext} for file {os.path.basename(file_path)}"
@@ -60,34 +215,47 @@ class ChatBackend:
             return f"Error processing file {os.path.basename(file_path)}: {str(e)}"
 
     def extract_text_from_pdf(self, pdf_path):
-        """Extract text from a PDF file"""
+        """Extract text from a PDF file, preferring the C-backed pymupdf parser"""
+        if fitz is not None:
+            try:
+                with fitz.open(pdf_path) as doc:
+                    return "\n".join(page.get_text("text") for page in doc)
+            except Exception as e:
+                print(f"pymupdf failed on {os.path.basename(pdf_path)}, falling back to PyPDF2: {str(e)}")
+
         try:
             pdf_reader = PdfReader(pdf_path)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            return text
+            num_pages = len(pdf_reader.pages)
+
+            if num_pages >= PDF_PARALLEL_MIN_PAGES:
+                # Page parsing is CPU-bound pure Python, so spread pages over
+                # processes to get around the GIL
+                executor = _get_pdf_executor()
+                pages = executor.map(_extract_single_page, [(pdf_path, i) for i in range(num_pages)])
+                return "\n".join(pages)
+
+            # join() is linear in total size, unlike repeated string +=
+            return "\n".join(page.extract_text() or "" for page in pdf_reader.pages)
         except Exception as e:
             return f"Error extracting text from PDF {os.path.basename(pdf_path)}: {str(e)}"
 
     def process_files(self, file_paths):
         """Process multiple files and create a vector store from their content"""
-        all_text = ""
-        for file_path in file_paths:
-            file_text = self.process_file(file_path)
-            all_text += file_text + "\n\n" + "-" * 50 + "\n\n"
-         
-        text_splitter = CharacterTextSplitter(
-            separator="\n",
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len
-        )
-        text_chunks = text_splitter.split_text(all_text)
+        # File parsing is a mix of disk I/O and C-backed libraries (fitz,
+        # pandas) that release the GIL, so threads give real overlap. Each
+        # file is split as soon as its text arrives, so only one file's text
+        # is held at a time instead of one string covering the whole corpus.
+        text_chunks = []
+        max_workers = max(1, min(len(file_paths), os.cpu_count() or 4))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for file_text in executor.map(self.process_file, file_paths):
+                text_chunks.extend(_split_text(file_text))
         
         if not text_chunks:
             return False, "No text content was extracted from the files"
      
+        self._exact_cache.clear()
+        self._semantic_cache.clear()
         self.vectorstore = self.create_vectorstore(text_chunks)
         
         if not self.vectorstore:
@@ -103,13 +271,199 @@ class ChatBackend:
     def create_vectorstore(self, text_chunks):
         """Create a vector store from text chunks using HuggingFace embeddings"""
         try:
-            embeddings = HuggingFaceEmbeddings(model_name="BAAI/bge-small-en-v1.5")
-            vectorstore = FAISS.from_texts(texts=text_chunks, embedding=embeddings)
+            embeddings = _get_embeddings()
+            # Only take the flat-index GPU path when the move can actually
+            # happen; with faiss-cpu or no visible GPU, setting USE_FAISS_GPU
+            # would otherwise trade HNSW for a flat CPU scan
+            use_gpu = (
+                os.environ.get("USE_FAISS_GPU", "").lower() in ("1", "true", "yes")
+                and self._faiss_gpu_available()
+            )
+
+            cache_dir = self._index_cache_dir(text_chunks, use_gpu)
+            vectorstore = self._load_cached_vectorstore(cache_dir, embeddings)
+
+            if vectorstore is None:
+                vectors = self._embed_texts(embeddings, text_chunks)
+                if use_gpu:
+                    # HNSW has no GPU implementation, so keep the flat index
+                    # when the caller asked for GPU search
+                    vectorstore = FAISS.from_embeddings(
+                        text_embeddings=list(zip(text_chunks, vectors)),
+                        embedding=embeddings
+                    )
+                else:
+                    vectorstore = self._build_hnsw_vectorstore(embeddings, text_chunks, vectors)
+                self._save_cached_vectorstore(vectorstore, cache_dir)
+
+            if use_gpu:
+                self._maybe_move_index_to_gpu(vectorstore)
             return vectorstore
         except Exception as e:
             print(f"Error creating vector store: {str(e)}")
             return None
 
+    def _index_cache_dir(self, text_chunks, use_gpu):
+        """Directory where the index for this exact chunk content is persisted"""
+        digest = hashlib.md5()
+        digest.update(b"flat" if use_gpu else b"hnsw")
+        for chunk in text_chunks:
+            digest.update(chunk.encode("utf-8", errors="ignore"))
+        # Keep the cache under the user's home, not the world-writable temp
+        # dir — load_local unpickles, so the tree must not be plantable by
+        # other local users
+        base_dir = os.environ.get(
+            "FAISS_INDEX_DIR",
+            os.path.join(os.path.expanduser("~"), ".cache", "azure_chatbot_faiss")
+        )
+        os.makedirs(base_dir, mode=0o700, exist_ok=True)
+        return os.path.join(base_dir, digest.hexdigest())
+
+    def _load_cached_vectorstore(self, cache_dir, embeddings):
+        """Load a previously saved index for identical content, if any"""
+        if not os.path.isdir(cache_dir):
+            return None
+        try:
+            vectorstore = FAISS.load_local(
+                cache_dir, embeddings, allow_dangerous_deserialization=True
+            )
+            print(f"Loaded FAISS index from cache: {cache_dir}")
+            return vectorstore
+        except Exception as e:
+            print(f"Could not load cached FAISS index, rebuilding: {str(e)}")
+            return None
+
+    def _save_cached_vectorstore(self, vectorstore, cache_dir):
+        """Persist the freshly built index so restarts skip re-embedding"""
+        try:
+            vectorstore.save_local(cache_dir)
+        except Exception as e:
+            print(f"Could not persist FAISS index: {str(e)}")
+
+    def _build_hnsw_vectorstore(self, embeddings, text_chunks, vectors):
+        """Wrap an HNSW index in a FAISS vectorstore for sublinear retrieval"""
+        import faiss
+        from langchain_community.docstore.in_memory import InMemoryDocstore
+        from langchain_core.documents import Document
+
+        index = faiss.IndexHNSWFlat(len(vectors[0]), 32)
+        index.hnsw.efConstruction = 200
+        index.add(np.asarray(vectors, dtype="float32"))
+        index.hnsw.efSearch = 64
+
+        docstore = InMemoryDocstore(
+            {str(i): Document(page_content=chunk) for i, chunk in enumerate(text_chunks)}
+        )
+        return FAISS(
+            embedding_function=embeddings,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id={i: str(i) for i in range(len(text_chunks))}
+        )
+
+    def _faiss_gpu_available(self):
+        """True when faiss is a GPU build with at least one visible GPU"""
+        try:
+            import faiss
+            return faiss.get_num_gpus() > 0
+        except Exception:
+            # faiss-cpu builds do not expose the GPU API at all
+            return False
+
+    def _maybe_move_index_to_gpu(self, vectorstore):
+        """Move the FAISS index to GPU, falling back to CPU on failure"""
+        try:
+            import faiss
+            vectorstore.index = faiss.index_cpu_to_all_gpus(vectorstore.index)
+            print(f"FAISS index moved to {faiss.get_num_gpus()} GPU(s)")
+        except Exception as e:
+            print(f"Could not move FAISS index to GPU, staying on CPU: {str(e)}")
+
+    def _embed_texts(self, embeddings, text_chunks):
+        """Embed chunks in token-bounded batches to minimize padding waste"""
+        try:
+            return self._embed_token_batched(embeddings, text_chunks)
+        except Exception as e:
+            print(f"Token-batched embedding failed, using embed_documents: {str(e)}")
+            return embeddings.embed_documents(text_chunks)
+
+    def _embed_token_batched(self, embeddings, text_chunks):
+        """Tokenize and pad batches in a producer thread while the model consumes
+
+        encode() re-sorts its input by character length internally, so batch
+        composition can only be controlled by padding each batch here and
+        calling the model forward directly. Chunks are tokenized in slices of
+        TOKENIZE_SLICE so the forward pass can start on early batches while
+        later slices are still being tokenized; the tokenizer runs in Rust
+        and the model in torch kernels, both off the GIL, so the two stages
+        genuinely overlap.
+        """
+        import torch
+
+        model = embeddings.client
+        tokenizer = model.tokenizer
+        max_length = getattr(model, "max_seq_length", 512)
+
+        batch_queue = queue.Queue(maxsize=EMBED_QUEUE_DEPTH)
+        producer_error = []
+
+        def produce():
+            try:
+                for start in range(0, len(text_chunks), TOKENIZE_SLICE):
+                    slice_chunks = text_chunks[start:start + TOKENIZE_SLICE]
+                    encoded = tokenizer(
+                        slice_chunks, truncation=True, max_length=max_length, padding=False
+                    )
+                    lengths = [len(ids) for ids in encoded["input_ids"]]
+                    order = sorted(range(len(slice_chunks)), key=lambda i: lengths[i])
+                    for batch_indices in self._pack_token_batches(order, lengths):
+                        features = tokenizer.pad(
+                            {key: [values[i] for i in batch_indices] for key, values in encoded.items()},
+                            return_tensors="pt"
+                        )
+                        batch_queue.put(([start + i for i in batch_indices], features))
+            except Exception as e:
+                producer_error.append(e)
+            finally:
+                batch_queue.put(None)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+
+        model.eval()
+        vectors = [None] * len(text_chunks)
+        with torch.no_grad():
+            while True:
+                item = batch_queue.get()
+                if item is None:
+                    break
+                batch_positions, features = item
+                features = {key: value.to(model.device) for key, value in features.items()}
+                output = model.forward(features)["sentence_embedding"]
+                output = torch.nn.functional.normalize(output, p=2, dim=1)
+                for position, vector in zip(batch_positions, output.cpu().numpy()):
+                    vectors[position] = vector.tolist()
+        producer.join()
+
+        if producer_error:
+            raise producer_error[0]
+        return vectors
+
+    def _pack_token_batches(self, order, lengths):
+        """Pack length-sorted indices into batches bounded by padded token count"""
+        batches = []
+        current = []
+        for index in order:
+            # Sorted ascending, so the newest member sets the padded width
+            padded_tokens = (len(current) + 1) * lengths[index]
+            if current and (len(current) >= EMBED_BATCH_SIZE or padded_tokens > EMBED_BATCH_TOKENS):
+                batches.append(current)
+                current = []
+            current.append(index)
+        if current:
+            batches.append(current)
+        return batches
+
     def setup_conversation_chain(self, vectorstore):
         """Set up the conversation chain with the LLM and vector store""" 
         groq_api_key = os.environ.get("GROQ_API_KEY")
@@ -135,15 +489,31 @@ class ChatBackend:
             # )
             # print(llm.metadata)
              
-            memory = ConversationBufferMemory(
+            # Window memory keeps only the last exchanges, so the prompt (and
+            # LLM latency/cost) stops growing with conversation length
+            memory = ConversationBufferWindowMemory(
+                k=6,
                 memory_key="chat_history",
                 return_messages=True,
                 output_key="answer"
             )
             
+            # Size k to the corpus: asking for 5 neighbours of a 3-chunk
+            # corpus just pads the prompt, and MMR over a slightly larger
+            # candidate pool trades near-duplicate chunks for coverage
+            try:
+                num_chunks = int(vectorstore.index.ntotal)
+            except Exception:
+                num_chunks = 5
+            k = max(2, min(5, num_chunks))
+            fetch_k = min(num_chunks, 4 * k)
+
             conversation_chain = ConversationalRetrievalChain.from_llm(
                 llm=llm,
-                retriever=vectorstore.as_retriever(search_kwargs={"k": 5}),
+                retriever=vectorstore.as_retriever(
+                    search_type="mmr",
+                    search_kwargs={"k": k, "fetch_k": fetch_k, "lambda_mult": 0.5}
+                ),
                 memory=memory,
                 return_source_documents=True,
                 verbose=False
@@ -158,26 +528,85 @@ class ChatBackend:
         """Process a user question and get a response from the conversation chain"""
         if self.conversation is None:
             return {"error": "Conversation chain not initialized. Process data first."}
-        
+
+        cached = self._lookup_cached_answer(question)
+        if cached is not None:
+            self._record_cached_exchange(question, cached["answer"])
+            return {
+                "answer": cached["answer"],
+                "chat_history": self.chat_history,
+                "source_documents": cached["source_documents"]
+            }
+
         try:
             response = self.conversation.invoke({
                 'question': question
             })
-             
+
             self.chat_history = response['chat_history']
-            
-            return {
+
+            result = {
                 "answer": response['answer'],
                 "chat_history": response['chat_history'],
                 "source_documents": response['source_documents'] if 'source_documents' in response else []
             }
+            self._cache_answer(question, result)
+            return result
         except Exception as e:
             return {"error": f"Error processing question: {str(e)}"}
 
+    def _record_cached_exchange(self, question, answer):
+        """Append a cache-served exchange to memory so the transcript shows it"""
+        try:
+            memory = self.conversation.memory
+            memory.save_context({"question": question}, {"answer": answer})
+            self.chat_history = memory.load_memory_variables({}).get(
+                "chat_history", self.chat_history
+            )
+        except Exception as e:
+            print(f"Could not record cached exchange in memory: {str(e)}")
+
+    def _lookup_cached_answer(self, question):
+        """Return a cached answer for an identical or near-identical question"""
+        key = question.strip().lower()
+        if key in self._exact_cache:
+            return self._exact_cache[key]
+
+        if not self._semantic_cache or self.vectorstore is None:
+            return None
+        try:
+            query_vector = np.asarray(
+                self.vectorstore.embedding_function.embed_query(question), dtype="float32"
+            )
+            cached_matrix = np.asarray(
+                [vector for vector, _ in self._semantic_cache], dtype="float32"
+            )
+            # Vectors are normalized, so one matrix-vector product gives
+            # every cosine similarity at once
+            similarities = cached_matrix @ query_vector
+            best = int(np.argmax(similarities))
+            if similarities[best] >= SEMANTIC_CACHE_THRESHOLD:
+                return self._semantic_cache[best][1]
+        except Exception as e:
+            print(f"Semantic cache lookup failed: {str(e)}")
+        return None
+
+    def _cache_answer(self, question, result):
+        """Store an answer under the question text and its embedding"""
+        cached = {"answer": result["answer"], "source_documents": result["source_documents"]}
+        self._exact_cache[question.strip().lower()] = cached
+        try:
+            query_vector = self.vectorstore.embedding_function.embed_query(question)
+            self._semantic_cache.append((query_vector, cached))
+        except Exception as e:
+            print(f"Could not add answer to semantic cache: {str(e)}")
+
     def clear_chat_history(self):
         """Clear the conversation history"""
         if self.conversation and hasattr(self.conversation, 'memory'):
             self.conversation.memory.clear()
             self.chat_history = None
+            self._exact_cache.clear()
+            self._semantic_cache.clear()
             return True
         return False
\ No newline at end of file
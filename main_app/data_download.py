@@ -1,8 +1,26 @@
 import os
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from azure.storage.blob import BlobServiceClient
 from dotenv import load_dotenv
 
+# Blob downloads are network-bound, so a handful of threads overlaps the waits
+MAX_DOWNLOAD_WORKERS = 8
+
+def _download_blob(container_client, blob, temp_dir):
+    """Download a single blob to the temp directory (runs in a worker thread)"""
+    file_path = os.path.join(temp_dir, blob.name)
+
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+    with open(file_path, "wb") as f:
+        # readinto streams the blob in chunks instead of buffering the whole
+        # download in memory like readall(); max_concurrency lets the SDK
+        # fetch blocks of large blobs in parallel
+        container_client.download_blob(blob, max_concurrency=4).readinto(f)
+
+    return file_path
+
 def download_from_azure():
     """Download files from Azure Blob Storage to a temporary directory""" 
     load_dotenv()
@@ -20,17 +38,13 @@ def download_from_azure():
         blob_service = BlobServiceClient.from_connection_string(conn_str)
         container_client = blob_service.get_container_client(container_name)
  
-        downloaded_files = []
-        for blob in container_client.list_blobs():
-            file_path = os.path.join(temp_dir, blob.name)
-             
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-             
-            with open(file_path, "wb") as f:
-                f.write(container_client.download_blob(blob).readall())
-            
-            downloaded_files.append(file_path)
-        
+        blobs = list(container_client.list_blobs())
+        with ThreadPoolExecutor(max_workers=MAX_DOWNLOAD_WORKERS) as executor:
+            downloaded_files = list(executor.map(
+                lambda blob: _download_blob(container_client, blob, temp_dir),
+                blobs
+            ))
+
         print(f"✅ Downloaded {len(downloaded_files)} files from Azure")
         return temp_dir, downloaded_files
     
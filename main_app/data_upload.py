@@ -1,7 +1,33 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from azure.storage.blob import BlobServiceClient, ContentSettings
 from dotenv import load_dotenv
 
+# Uploads are network-bound, so a few threads overlap the round trips
+MAX_UPLOAD_WORKERS = 8
+
+def _upload_file(container_client, local_file, content_type):
+    """Upload a single file to the container (runs in a worker thread)"""
+    if not os.path.exists(local_file):
+        print(f"Warning: File not found - {local_file}")
+        return False
+
+    blob_name = os.path.basename(local_file)
+    try:
+        with open(local_file, "rb") as data:
+            container_client.upload_blob(
+                name=blob_name,
+                data=data,
+                overwrite=True,
+                content_settings=ContentSettings(content_type=content_type),
+                max_concurrency=4
+            )
+        print(f"✅ Uploaded {blob_name} as {content_type}")
+        return True
+    except Exception as e:
+        print(f"Error uploading {blob_name}: {str(e)}")
+        return False
+
 def upload_to_azure(files_to_upload):
     """
     Upload files to Azure Blob Storage
@@ -28,25 +54,13 @@ def upload_to_azure(files_to_upload):
     except Exception:
         print(f"Using existing container: {container_name}")
      
-    for local_file, content_type in files_to_upload.items():
-        if not os.path.exists(local_file):
-            print(f"Warning: File not found - {local_file}")
-            continue
-            
-        blob_name = os.path.basename(local_file)
-        try:
-            with open(local_file, "rb") as data:
-                container_client.upload_blob(
-                    name=blob_name,
-                    data=data,
-                    overwrite=True,
-                    content_settings=ContentSettings(content_type=content_type)
-                )
-            print(f"✅ Uploaded {blob_name} as {content_type}")
-        except Exception as e:
-            print(f"Error uploading {blob_name}: {str(e)}")
-    
-    return True
+    with ThreadPoolExecutor(max_workers=MAX_UPLOAD_WORKERS) as executor:
+        results = list(executor.map(
+            lambda item: _upload_file(container_client, item[0], item[1]),
+            files_to_upload.items()
+        ))
+
+    return all(results)
 
 if __name__ == "__main__": 
     files_to_upload = {